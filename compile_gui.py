@@ -1,9 +1,15 @@
+import hashlib
+import json
 import os
 import shutil
 import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
 UI_FILE_ROOT_DIRECTORY = "ui"
 GENERATED_OUTPUT_DIRECTORY = "ui_generated"  # Relative path from this script
+MANIFEST_FILE_NAME = ".ui_manifest.json"  # Stored in the output directory, maps each .ui file to its content hash and output
+CLEAN_BUILD_ARGUMENT = "--clean"
 
 def clear_ui_generated_directory(output_directory: str):
     if os.path.exists(output_directory):
@@ -14,34 +20,114 @@ def clear_ui_generated_directory(output_directory: str):
     os.makedirs(output_directory)
 
 
-def find_and_generate_ui(input_directory: str, output_directory: str):
+def load_manifest(output_directory: str) -> dict:
+    manifest_path = os.path.join(output_directory, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+
+    try:
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(output_directory: str, manifest: dict):
+    with open(os.path.join(output_directory, MANIFEST_FILE_NAME), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+
+def hash_file(file_path: str) -> str:
+    with open(file_path, "rb") as hashed_file:
+        return hashlib.sha256(hashed_file.read()).hexdigest()
+
+
+def compile_ui_file(ui_path: str, py_path: str):
+    """
+    Runs pyside6-uic for one .ui file
+    :return: Error string, or None if compilation succeeded
+    """
+    print(f"Compiling: {ui_path} → {py_path}")
+    try:
+        subprocess.run(["pyside6-uic", ui_path, "-o", py_path], check=True)
+        print(f"Successfully compiled: {py_path}")
+        return None
+    except (subprocess.CalledProcessError, OSError) as e:
+        err_str = f"Error compiling {ui_path}: {e}"
+        print(err_str)
+        return err_str
+
+
+def find_and_generate_ui(input_directory: str, output_directory: str, max_workers: int = None):
     """
     Walks through the "input_directory" (and all subdirectories) and finds all .ui files
     pyside6-uic compiler generates the .py file for each .ui file found
     Outputs to the "output_directory" location
+
+    Only .ui files whose content hash differs from the manifest (or whose output is missing) are compiled, concurrently
+    across a worker pool. Outputs of .ui files that no longer exist are deleted
+    Outputs are named after the .ui file only, so .ui files in different subdirectories sharing a name are reported as errors
+    and none of them are compiled
     """
     if not os.path.exists(input_directory):
         print(f"Error: Directory holding .ui files does not exist. Directory checked: {input_directory}. Exiting now.")
         exit(1)
 
-    errors = []
+    os.makedirs(output_directory, exist_ok=True)
+    manifest = load_manifest(output_directory)
+
+    # Find every .ui file and its current hash. Manifest keys are relative to the input directory
+    ui_files = {}
     for dirpath, _, filenames in os.walk(input_directory):  # Walk through all subdirectories
         for filename in filenames:
             if filename.endswith(".ui"):
                 ui_path = os.path.join(dirpath, filename)
-                output_path = os.path.join(output_directory, filename)
-                py_path = os.path.splitext(output_path)[0] + ".py"  # Replace .ui with .py
+                py_name = os.path.splitext(filename)[0] + ".py"  # Replace .ui with .py
+                ui_files[os.path.relpath(ui_path, input_directory)] = (ui_path, hash_file(ui_path), py_name)
+
+    # Detect .ui files that would overwrite each other's output before submitting any jobs
+    ui_keys_by_output = {}
+    for ui_key, (_, _, py_name) in ui_files.items():
+        ui_keys_by_output.setdefault(py_name, []).append(ui_key)
+
+    errors = []
+    for py_name, ui_keys in ui_keys_by_output.items():
+        if len(ui_keys) > 1:
+            err_str = f"Error: {', '.join(sorted(ui_keys))} would all compile to {py_name}, rename all but one. Skipping them"
+            print(err_str)
+            errors.append(err_str)
+
+    # Remove outputs for deleted .ui files, unless another .ui file still compiles to the same output
+    for ui_key in [ui_key for ui_key in manifest if ui_key not in ui_files]:
+        stale_py_name = manifest.pop(ui_key)["output"]
+        stale_py_path = os.path.join(output_directory, stale_py_name)
+        if stale_py_name not in ui_keys_by_output and os.path.exists(stale_py_path):
+            os.remove(stale_py_path)
+            print(f"Removed output of deleted file: {stale_py_path}")
+
+    # Work out which files actually need compiling
+    to_compile = []
+    for ui_key, (ui_path, ui_hash, py_name) in ui_files.items():
+        if len(ui_keys_by_output[py_name]) > 1:
+            continue
+        entry = manifest.get(ui_key)
+        if entry is not None and entry["hash"] == ui_hash and os.path.exists(os.path.join(output_directory, entry["output"])):
+            continue
+        to_compile.append((ui_key, ui_path, ui_hash, py_name))
+
+    print(f"{len(to_compile)} of {len(ui_files)} .ui files changed")
 
-                print(f"Compiling: {ui_path} → {py_path}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda job: compile_ui_file(job[1], os.path.join(output_directory, job[3])), to_compile)
+        for (ui_key, _, ui_hash, py_name), err_str in zip(to_compile, results):
+            if err_str is None:
+                manifest[ui_key] = {"hash": ui_hash, "output": py_name}
+            else:
+                manifest.pop(ui_key, None)  # Force a retry next time
+                errors.append(err_str)
 
-                # Run pyside6-uic command
-                try:
-                    subprocess.run(["pyside6-uic", ui_path, "-o", py_path], check=True)
-                    print(f"Successfully compiled: {py_path}")
-                except subprocess.CalledProcessError as e:
-                    err_str = f"Error compiling {ui_path}: {e}"
-                    print(err_str)
-                    errors.append(err_str)
+    save_manifest(output_directory, manifest)
 
     if not errors:
         # No errors, return
@@ -59,7 +145,9 @@ if __name__ == "__main__":
     ui_directory = os.path.join(cwd, UI_FILE_ROOT_DIRECTORY)
     output_directory = os.path.join(cwd, GENERATED_OUTPUT_DIRECTORY)
 
-    clear_ui_generated_directory(output_directory)
+    # Full rebuild only when asked for, otherwise compile incrementally
+    if CLEAN_BUILD_ARGUMENT in sys.argv[1:]:
+        clear_ui_generated_directory(output_directory)
 
     try:
         find_and_generate_ui(ui_directory, output_directory)
@@ -0,0 +1,296 @@
+"""
+Compressed archive format for long-term acoustic storage.
+
+Layout: MAGIC, compressed channel blocks, JSON index, 8 byte little-endian index offset, MAGIC.
+Data is written in chunks of (lines, sensors, samples). Each channel of a chunk is compressed on its own and the index
+records its byte offset, so any chunk or channel can be read without touching the rest of the file.
+Samples are either kept as float32 with byte shuffling (lossless), or quantized to int16/int24 with a per channel scale factor.
+A channel block containing NaN or inf can't be quantized, so it is stored lossless and its index entry records that.
+"""
+import json
+import lzma
+import mmap
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Iterator, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+ARCHIVE_MAGIC = b"ACARCH01"
+ARCHIVE_VERSION = 1
+INDEX_OFFSET_FORMAT = "<Q"
+FOOTER_LENGTH = struct.calcsize(INDEX_OFFSET_FORMAT) + len(ARCHIVE_MAGIC)
+
+DEFAULT_ZLIB_LEVEL = 6
+DEFAULT_LZMA_PRESET = 6
+DEFAULT_PREFETCH_CHUNKS = 8  # Chunks decoded ahead of the consumer when replaying
+
+
+class ArchiveCompressionEnum(Enum):
+    """Stdlib compressors available for channel blocks"""
+    ZLIB = "zlib"
+    LZMA = "lzma"
+
+class ArchiveQuantizationEnum(Enum):
+    """Sample encoding before compression, value is the number of bytes stored per sample"""
+    NONE = 4  # Lossless float32
+    INT16 = 2
+    INT24 = 3
+
+
+def shuffle_bytes(values: npt.NDArray, itemsize: int) -> bytes:
+    """Groups byte 0 of every sample, then byte 1, etc. Exponent/high bytes compress far better when grouped"""
+    return np.ascontiguousarray(values).view(np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def unshuffle_bytes(data: bytes, itemsize: int) -> npt.NDArray:
+    return np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T.copy()
+
+
+def encode_channel(channel: npt.NDArray, quantization: ArchiveQuantizationEnum):
+    """
+    Encodes a single channel's samples into shuffled bytes
+    Channels with NaN or inf samples fall back to lossless float32, as those values have no integer code
+    :return: (shuffled bytes, scale factor, quantization used). Scale factor is 1.0 for lossless float32
+    """
+    if quantization == ArchiveQuantizationEnum.NONE or not np.all(np.isfinite(channel)):
+        return shuffle_bytes(channel.astype("<f4", copy=False), 4), 1.0, ArchiveQuantizationEnum.NONE
+
+    max_code = 2 ** (8 * quantization.value - 1) - 1
+    peak = float(np.max(np.abs(channel))) if channel.size else 0.0
+    scale = peak / max_code if peak > 0 else 1.0
+    # Divide in float64 so the peak cannot round past max_code and wrap around
+    codes = np.clip(np.round(channel / np.float64(scale)), -max_code, max_code).astype("<i4")
+
+    if quantization == ArchiveQuantizationEnum.INT16:
+        return shuffle_bytes(codes.astype("<i2"), 2), scale, quantization
+
+    # INT24: keep the low 3 bytes of each little-endian int32
+    low_bytes = codes.view(np.uint8).reshape(-1, 4)[:, :3]
+    return shuffle_bytes(low_bytes, 3), scale, quantization
+
+
+def decode_channel(data: bytes, quantization: ArchiveQuantizationEnum, scale: float) -> npt.NDArray:
+    """Inverse of encode_channel, returns float32 samples"""
+    sample_bytes = unshuffle_bytes(data, quantization.value)
+
+    if quantization == ArchiveQuantizationEnum.NONE:
+        return sample_bytes.view("<f4").reshape(-1)
+
+    if quantization == ArchiveQuantizationEnum.INT16:
+        codes = sample_bytes.view("<i2").reshape(-1)
+    else:
+        # INT24: sign extend the 3 stored bytes back to int32
+        padded = np.zeros((sample_bytes.shape[0], 4), dtype=np.uint8)
+        padded[:, :3] = sample_bytes
+        padded[:, 3] = np.where(sample_bytes[:, 2] & 0x80, 0xFF, 0)
+        codes = padded.view("<i4").reshape(-1)
+
+    return (codes * np.float32(scale)).astype(np.float32, copy=False)
+
+
+def compress(data: bytes, compression: ArchiveCompressionEnum, level: Optional[int] = None) -> bytes:
+    if compression == ArchiveCompressionEnum.ZLIB:
+        return zlib.compress(data, DEFAULT_ZLIB_LEVEL if level is None else level)
+    return lzma.compress(data, preset=DEFAULT_LZMA_PRESET if level is None else level)
+
+
+def decompress(data: bytes, compression: ArchiveCompressionEnum) -> bytes:
+    if compression == ArchiveCompressionEnum.ZLIB:
+        return zlib.decompress(data)
+    return lzma.decompress(data)
+
+
+class AcousticArchiveWriter:
+    """
+    Writes (lines, sensors, samples) blocks to a compressed archive
+    Channels of each block are compressed concurrently on a thread pool (zlib and lzma release the GIL)
+    Must be closed (or used as a context manager) to write the index, otherwise the archive cannot be read
+    """
+    def __init__(self, file_path: str, sample_rate: float, number_lines: int, total_sensors_per_line: int,
+                 compression: ArchiveCompressionEnum = ArchiveCompressionEnum.ZLIB, quantization: ArchiveQuantizationEnum = ArchiveQuantizationEnum.NONE,
+                 compression_level: Optional[int] = None, max_workers: Optional[int] = None):
+        self.file_path = file_path
+        self.sample_rate = sample_rate
+        self.number_lines = number_lines
+        self.total_sensors_per_line = total_sensors_per_line
+        self.compression = compression
+        self.quantization = quantization
+        self.compression_level = compression_level
+
+        self.chunks = []  # Index entries, one per written block
+        self.total_samples = 0
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.file = open(file_path, "wb")
+        self.file.write(ARCHIVE_MAGIC)
+
+    def write_block(self, block: npt.NDArray):
+        """
+        Compresses and appends one block to the archive
+        :param block: Sample data in the shape (lines, sensors, samples)
+        """
+        if block.shape[0] != self.number_lines or block.shape[1] != self.total_sensors_per_line:
+            raise RuntimeError(f"Block shape does not match archive shape. Expected ({self.number_lines},{self.total_sensors_per_line},n) but got {block.shape}")
+
+        number_samples = block.shape[2]
+        channels = block.reshape(-1, number_samples)
+        compressed_channels = list(self.executor.map(self.encode_and_compress, channels))
+
+        channel_entries = []
+        for compressed_data, scale, quantization in compressed_channels:
+            channel_entries.append([self.file.tell(), len(compressed_data), scale, quantization.name])
+            self.file.write(compressed_data)
+
+        self.chunks.append({"start_sample": self.total_samples, "number_samples": number_samples, "channels": channel_entries})
+        self.total_samples += number_samples
+
+    def encode_and_compress(self, channel: npt.NDArray):
+        encoded_data, scale, quantization = encode_channel(channel, self.quantization)
+        return compress(encoded_data, self.compression, self.compression_level), scale, quantization
+
+    def close(self):
+        if self.file.closed:
+            return
+
+        index = {
+            "version": ARCHIVE_VERSION,
+            "sample_rate": self.sample_rate,
+            "number_lines": self.number_lines,
+            "total_sensors_per_line": self.total_sensors_per_line,
+            "compression": self.compression.value,
+            "quantization": self.quantization.name,
+            "total_samples": self.total_samples,
+            "chunks": self.chunks,
+        }
+        index_offset = self.file.tell()
+        self.file.write(json.dumps(index).encode("utf-8"))
+        self.file.write(struct.pack(INDEX_OFFSET_FORMAT, index_offset))
+        self.file.write(ARCHIVE_MAGIC)
+        self.file.close()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AcousticArchiveReader:
+    """
+    Random access reader for archives written by AcousticArchiveWriter
+    Channel blocks are decompressed in parallel on a thread pool, and iter_chunks decodes ahead of the consumer so
+    archived sessions can be replayed faster than real time
+    """
+    def __init__(self, file_path: str, max_workers: Optional[int] = None):
+        self.file_path = file_path
+        with open(file_path, "rb") as archive_file:
+            self.mapped_file = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mapped_file[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC or self.mapped_file[-len(ARCHIVE_MAGIC):] != ARCHIVE_MAGIC:
+            self.mapped_file.close()
+            raise RuntimeError(f"{file_path} is not a complete acoustic archive")
+
+        footer_start = len(self.mapped_file) - FOOTER_LENGTH
+        index_offset, = struct.unpack_from(INDEX_OFFSET_FORMAT, self.mapped_file, footer_start)
+        index = json.loads(self.mapped_file[index_offset:footer_start].decode("utf-8"))
+
+        self.sample_rate = index["sample_rate"]
+        self.number_lines = index["number_lines"]
+        self.total_sensors_per_line = index["total_sensors_per_line"]
+        self.compression = ArchiveCompressionEnum(index["compression"])
+        self.quantization = ArchiveQuantizationEnum[index["quantization"]]
+        self.total_samples = index["total_samples"]
+        self.chunks = index["chunks"]
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    @property
+    def number_chunks(self) -> int:
+        return len(self.chunks)
+
+    def read_chunk(self, chunk_number: int) -> npt.NDArray:
+        """Reads a full chunk, returns float32 data in the shape (lines, sensors, samples)"""
+        chunk = self.chunks[chunk_number]
+        channels = list(self.executor.map(self.decode_channel_entry, chunk["channels"]))
+        return np.stack(channels).reshape(self.number_lines, self.total_sensors_per_line, chunk["number_samples"])
+
+    def read_channel(self, chunk_number: int, line_number: int, sensor_number: int) -> npt.NDArray:
+        """Reads a single channel of a chunk without decompressing any other channel"""
+        channel_entry = self.chunks[chunk_number]["channels"][line_number * self.total_sensors_per_line + sensor_number]
+        return self.decode_channel_entry(channel_entry)
+
+    def read_samples(self, start_sample: int, stop_sample: int) -> npt.NDArray:
+        """Reads an arbitrary sample range, only decompressing the chunks that overlap it"""
+        start_sample = max(start_sample, 0)
+        stop_sample = min(stop_sample, self.total_samples)
+        overlapping = [chunk_number for chunk_number, chunk in enumerate(self.chunks)
+                       if chunk["start_sample"] < stop_sample and chunk["start_sample"] + chunk["number_samples"] > start_sample]
+
+        output = np.empty((self.number_lines, self.total_sensors_per_line, max(stop_sample - start_sample, 0)), dtype=np.float32)
+        for chunk_number, chunk_data in zip(overlapping, self.executor.map(self.read_chunk_serial, overlapping)):
+            chunk_start = self.chunks[chunk_number]["start_sample"]
+            copy_start = max(start_sample, chunk_start)
+            copy_stop = min(stop_sample, chunk_start + chunk_data.shape[2])
+            output[..., copy_start - start_sample:copy_stop - start_sample] = chunk_data[..., copy_start - chunk_start:copy_stop - chunk_start]
+        return output
+
+    def iter_chunks(self, prefetch: int = DEFAULT_PREFETCH_CHUNKS) -> Iterator[npt.NDArray]:
+        """Yields every chunk in order, keeping up to "prefetch" chunks decoding in the background"""
+        pending = deque()
+        next_chunk = 0
+        while next_chunk < self.number_chunks or pending:
+            while next_chunk < self.number_chunks and len(pending) < prefetch:
+                pending.append(self.executor.submit(self.read_chunk_serial, next_chunk))
+                next_chunk += 1
+            yield pending.popleft().result()
+
+    def read_chunk_serial(self, chunk_number: int) -> npt.NDArray:
+        """Decodes a chunk on the calling thread. Used when chunks themselves are spread across the pool"""
+        chunk = self.chunks[chunk_number]
+        channels = [self.decode_channel_entry(channel_entry) for channel_entry in chunk["channels"]]
+        return np.stack(channels).reshape(self.number_lines, self.total_sensors_per_line, chunk["number_samples"])
+
+    def decode_channel_entry(self, channel_entry: List) -> npt.NDArray:
+        offset, length, scale, quantization_name = channel_entry
+        return decode_channel(decompress(self.mapped_file[offset:offset + length], self.compression), ArchiveQuantizationEnum[quantization_name], scale)
+
+    def close(self):
+        self.executor.shutdown()
+        self.mapped_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    rng = np.random.default_rng(0)
+    blocks = [rng.normal(0, 0.1, (2, 112, 5120)).astype(np.float32) for _ in range(4)]
+
+    for quantization in ArchiveQuantizationEnum:
+        archive_path = os.path.join(tempfile.gettempdir(), f"acoustic_archive_{quantization.name.lower()}.acarch")
+        with AcousticArchiveWriter(archive_path, 5120, 2, 112, quantization=quantization) as writer:
+            for block in blocks:
+                writer.write_block(block)
+
+        start = time.perf_counter()
+        with AcousticArchiveReader(archive_path) as reader:
+            replayed = np.concatenate(list(reader.iter_chunks()), axis=2)
+        read_seconds = time.perf_counter() - start
+
+        ratio = sum(block.nbytes for block in blocks) / os.path.getsize(archive_path)
+        max_error = float(np.max(np.abs(replayed - np.concatenate(blocks, axis=2))))
+        print(f"{quantization.name}: compression ratio {ratio:.2f}, max error {max_error:.2e}, replay {read_seconds:.3f} s for {len(blocks)} s of data")
+        os.remove(archive_path)
@@ -0,0 +1,401 @@
+"""
+Qt-free acoustic processing core.
+Everything in this module can be imported without PySide6, so worker processes, batch jobs and headless services
+can use the DSP and storage logic without paying for the Qt import or needing an event loop.
+Results are delivered through plain callbacks or generators. Qt adapters live in fft_handler.py.
+"""
+from enum import Enum
+from typing import Callable, Iterator, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import scipy.fft
+
+from fft_generation.acoustic_archive import AcousticArchiveWriter, ArchiveCompressionEnum, ArchiveQuantizationEnum
+from fft_generation.spectrum_history import SpectrumHistory
+
+MS_IN_S = 1000  # 1000ms per second
+
+# Default values for FFT calculations
+DEFAULT_SAMPLE_RATE_HF = 5120  # Default sampling rate for FFT Handler
+DEFAULT_SAMPLE_RATE_LF = DEFAULT_SAMPLE_RATE_HF / 2
+DEFAULT_WINDOW_LENGTH_MS = 100  # Default window length in milliseconds
+DEFAULT_WINDOW_OVERLAP = 0.75  # Default ratio for window overlap
+DEFAULT_FFT_INTERVAL = 100  # Default interval between FFTs
+
+# TODO: Move away from these defaults and allow for the array config message to set these values
+NUMBER_LF_CHANNELS_PER_LINE = 40
+NUMBER_HF_CHANNELS_PER_LINE = 32
+
+DEFAULT_TOTAL_SENSORS_PER_LINE = NUMBER_LF_CHANNELS_PER_LINE + NUMBER_HF_CHANNELS_PER_LINE + NUMBER_LF_CHANNELS_PER_LINE
+DEFAULT_NUMBER_LINES = 2
+
+TOTAL_SAMPLES_PER_MESSAGE = DEFAULT_NUMBER_LINES * DEFAULT_TOTAL_SENSORS_PER_LINE * DEFAULT_SAMPLE_RATE_HF
+TOTAL_SAMPLE_BYTES_PER_MESSAGE = TOTAL_SAMPLES_PER_MESSAGE * 4  # 4 bytes in each sample (float32)
+
+DEFAULT_FFT_WORKERS = -1  # scipy.fft worker threads for batched transforms, -1 uses every CPU
+FLOAT32_FFT_ACCURACY_BOUND = 1e-5  # Max FFT amplitude error of the float32 path, relative to the float64 reference peak
+
+# Callback types used in place of Qt signals
+SpectrumCallback = Callable[[npt.NDArray, npt.NDArray], None]  # <np.array(x_axis), np.array(y_axis)>
+RawDataCallback = Callable[[npt.NDArray], None]
+
+
+class WindowingFunctionEnum(Enum):
+    """Window function types and their corresponding method calls"""
+    RECTANGULAR = lambda values: values
+    HAMMING = np.hamming
+    HANNING = np.hanning
+    BARTLETT = np.bartlett
+    BLACKMAN = np.blackman
+
+def generate_window(windowing_function, window_length_samples: int, dtype: npt.DTypeLike = np.float64) -> npt.NDArray:
+    """
+    Builds the window coefficient array for a windowing function
+    RECTANGULAR returns the scalar length rather than an array, so it is expanded to ones of the window length
+    """
+    coefficients = np.asarray(windowing_function(window_length_samples), dtype=dtype)
+    if coefficients.ndim == 0:
+        coefficients = np.ones(window_length_samples, dtype=dtype)
+    return coefficients
+
+class PrecisionEnum(Enum):
+    """Numeric precision for sample storage, windowing and FFTs: (real dtype, complex dtype)"""
+    SINGLE = (np.float32, np.complex64)  # Matches the incoming float32 samples, half the memory bandwidth of DOUBLE
+    DOUBLE = (np.float64, np.complex128)  # Reference precision
+
+    @property
+    def real_dtype(self):
+        return np.dtype(self.value[0])
+
+    @property
+    def complex_dtype(self):
+        return np.dtype(self.value[1])
+
+DEFAULT_PRECISION = PrecisionEnum.SINGLE
+
+class ScalingOptionsEnum(Enum):
+    RAW = 0  # Range of -1.0 to 1.0
+    VOLTS = 1  # Converted to Volts
+    POWER = 2  # Converted to Power
+    DBV_ROOT_HZ = 3  # Converted to DBV root Hz
+
+
+class AcousticProcessor:
+    """
+    Qt-free class used to handle all acoustic data processing
+    De-interleaves incoming acoustic data, caches it and feeds the FFT Handler. Results are passed to the provided callbacks
+    """
+    def __init__(self, sample_rate: float = DEFAULT_SAMPLE_RATE_HF, window_length_ms: int = DEFAULT_WINDOW_LENGTH_MS, window_overlap: float = DEFAULT_WINDOW_OVERLAP,
+                 on_raw_data: Optional[RawDataCallback] = None, on_fft_amplitude: Optional[SpectrumCallback] = None, on_fft_phase: Optional[SpectrumCallback] = None,
+                 precision: PrecisionEnum = DEFAULT_PRECISION, fft_workers: int = DEFAULT_FFT_WORKERS):
+        # TODO: Update so that ArrayConfigMessage will change these values to values stored in message
+        self.number_lines = DEFAULT_NUMBER_LINES
+        self.total_sensors_per_line = DEFAULT_TOTAL_SENSORS_PER_LINE
+
+        # Callback for newly de-interleaved data
+        self.on_raw_data = on_raw_data
+
+        # Instantiate FFT Handler object for FFT calculations
+        self.fft_handler = FftHandler(sample_rate, on_fft_amplitude, on_fft_phase, window_length_ms, window_overlap, precision, fft_workers)
+
+        # Instantiate raw acoustic datat handler for caching and displaying raw acoustic data
+        self.raw_data_handler = RawAcousticDataHandler(precision=precision)
+
+        # TODO: Figure out how we are going to select sensors to display in FFTs
+        self.active_fft_sensor_number = (0, 0)  # Default to 0th line, 0th sensor for FFTs
+
+        # Optional processing pipeline (see pipeline.py), pushed every de-interleaved (lines, sensors, samples) block
+        self.pipeline = None
+
+    def set_active_sensor(self, sensor_number: Tuple[int, int]):
+        # Check validity of sensor number
+        if sensor_number[0] >= DEFAULT_NUMBER_LINES or sensor_number[1] >= DEFAULT_TOTAL_SENSORS_PER_LINE:
+            RuntimeError(f"Trying to access samples for non existent sensor. Sensor array bounds are ({DEFAULT_NUMBER_LINES},{DEFAULT_TOTAL_SENSORS_PER_LINE}), tried to access ({sensor_number[0]},{sensor_number[1]})")
+
+        self.active_fft_sensor_number = sensor_number
+
+    def retrieve_acoustic_data(self, data_array: npt.NDArray) -> npt.NDArray:
+        """
+        Called any time an Acoustic Data Message is received.
+        De-interleaves acoustic data and adds to cached data, as well as adding new signal data to FFT Handler
+        :return: De-interleaved data in the shape (lines, sensors, samples)
+        """
+        if not isinstance(data_array, np.ndarray):
+            raise RuntimeError(f"retrieve_acoustic_data method requires np.ndarray type to process. Received type {type(data_array).__name__}")
+
+        data_per_sample = np.reshape(data_array, (self.number_lines, self.total_sensors_per_line, -1))
+        if self.on_raw_data is not None:
+            self.on_raw_data(data_per_sample)
+
+        self.raw_data_handler.add_to_channels(data_per_sample)
+
+        if self.pipeline is not None:
+            self.pipeline.push(data_per_sample)
+
+        # TODO: Call FftHandler to calculate FFT on new data
+
+        return data_per_sample
+
+
+class FftHandler:
+    """
+    Class used to perform FFT calculations on provided signal data based on provided parameters
+    This class has no indication of timing intervals for FFT. It simply performs FFTs on the passed in signal
+    When FFTs calculations are complete, the amplitude and phase callbacks are called
+    """
+    def __init__(self, sample_rate: float, on_fft_amplitude: Optional[SpectrumCallback] = None, on_fft_phase: Optional[SpectrumCallback] = None, window_length_ms: int = DEFAULT_WINDOW_LENGTH_MS, window_overlap: float = DEFAULT_WINDOW_OVERLAP,
+                 precision: PrecisionEnum = DEFAULT_PRECISION, fft_workers: int = DEFAULT_FFT_WORKERS):
+        if sample_rate is None:
+            raise RuntimeError(f"Need to set sample_rate parameter for {FftHandler.__name__} instance")
+
+        self.sample_rate = sample_rate  # Sample rate in Hz
+        self.window_length_ms = window_length_ms  # Window length in ms
+        self.window_overlap = window_overlap  # window overlap ratio
+        self.precision = precision  # Storage, windowing and FFT precision
+        self.fft_workers = fft_workers
+
+        # FFT callbacks, e.g. for GUI plotting
+        self.on_fft_amplitude = on_fft_amplitude
+        self.on_fft_phase = on_fft_phase
+
+        # Calculate window samples and hop samples
+        # TODO: Investigate if window length should be divisible by base 2. (Simply rounding down for now)
+        self.window_length_samples = int((window_length_ms/1000) * self.sample_rate)
+        self.hop_length = int(self.window_length_samples * self.window_overlap)  # Samples to hop per window FFT calculation
+
+        # Set up windowing, pre-calculate window samples for more efficient future calculations
+        self.windowing_function = WindowingFunctionEnum.RECTANGULAR  # Default to Hanning function
+        self.windowing_coefficients = self.generate_windowing_coefficients()
+
+        # Empty active signal, gets added to when data begins coming in
+        self.sample_data = np.array([], dtype=self.precision.real_dtype)
+
+        # Generate reusable time/frequency vectors for each window calculation
+        self.time_vector, self.frequency_vector = self.generate_time_and_freq_vector()
+
+        # Bounded cache of recent amplitude spectra for freezing/scrubbing back without recomputing
+        self.spectrum_history = SpectrumHistory()
+
+
+    def add_signal(self, signal):
+        """
+        Adds sampled signal data to active signal for FFT Handler
+        Every window that becomes available is calculated, stored in the spectrum history and passed to the amplitude/phase callbacks
+        :param signal: Sampled signal to add to active signal in FFT Handler
+        """
+        for frequency_vector, _, amplitude, phase in self.compute_amplitude_phase_spectra(signal):
+            if self.on_fft_amplitude is not None:
+                self.on_fft_amplitude(frequency_vector, amplitude)
+            if self.on_fft_phase is not None:
+                self.on_fft_phase(frequency_vector, phase)
+
+
+    def compute_spectra(self, signal) -> Iterator[Tuple[npt.NDArray, npt.NDArray]]:
+        """
+        Generator form of "add_signal" for callers without callbacks.
+        Adds the signal to the active signal, then yields (frequency_vector, fft_data) for each window that is ready.
+        Every window is also stored in the spectrum history
+        :param signal: Sampled signal to add to active signal in FFT Handler
+        """
+        for frequency_vector, fft_data, _, _ in self.compute_amplitude_phase_spectra(signal):
+            yield frequency_vector, fft_data
+
+
+    def compute_amplitude_phase_spectra(self, signal) -> Iterator[Tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]]:
+        """
+        Adds the signal to the active signal, then yields (frequency_vector, fft_data, amplitude, phase) for each window that is ready
+        This is where spectra are computed, so it is also where they are recorded in the spectrum history
+        :param signal: Sampled signal to add to active signal in FFT Handler
+        """
+        # First add the signal to self.sample_data
+        # TODO: Do not append, have pre-allocated buffer
+        self.sample_data = np.append(self.sample_data, np.asarray(signal, dtype=self.precision.real_dtype))
+
+        while len(self.sample_data) >= self.window_length_samples:
+            # Calculate FFT on next window of samples
+            fft_data = self.fft_on_window(self.sample_data[:self.window_length_samples])
+            amplitude = np.abs(fft_data)
+            phase = np.angle(fft_data)
+            self.spectrum_history.append(self.frequency_vector, amplitude, phase)
+            yield self.frequency_vector, fft_data, amplitude, phase
+
+            # "Hop" forward by trimming off the next "hop_length" samples
+            # TODO: Moving window is likely unnecessary
+            self.sample_data = self.sample_data[self.hop_length:]
+
+
+    def fft_on_window(self, window_signal):
+        """
+        Performs FFT on a signal that has already been separated into its temporal window.
+        First applies windowing function to data signal, then performs the FFT calculation
+        :param window_signal: Signal ready to have FFT performed on it
+        :return: FFT values, complex64 or complex128 depending on precision
+        """
+        intermediate_data = np.multiply(self.windowing_coefficients, window_signal, dtype=self.precision.real_dtype)
+        return scipy.fft.fft(intermediate_data, workers=self.fft_workers)
+
+
+    def set_window_length(self, window_length_ms: int = DEFAULT_WINDOW_LENGTH_MS):
+        """
+        Sets window length and related attributes
+        :param window_length_ms: Desired window length
+        """
+        self.window_length_ms = window_length_ms
+        self.window_length_samples = int((window_length_ms / 1000) * self.sample_rate)
+        self.hop_length = int(self.window_length_samples * self.window_overlap)  # Samples to hop per window FFT calculation
+
+        # Recalculate windowing coefficients and generate new time/frequency vector
+        self.windowing_coefficients = self.generate_windowing_coefficients()
+        self.time_vector, self.frequency_vector = self.generate_time_and_freq_vector()
+
+
+    def set_windowing_function(self, windowing_func: WindowingFunctionEnum):
+        """
+        Updates windowing function to new value, recalculate the windowing coefficients.
+        :param windowing_func: Windowing enumeration
+        """
+        self.windowing_function = windowing_func
+        self.windowing_coefficients = self.generate_windowing_coefficients()
+
+
+    def generate_windowing_coefficients(self):
+        # Window functions return float64 (or a scalar for rectangular), cast once so windowing doesn't upcast the signal
+        return generate_window(self.windowing_function, self.window_length_samples, self.precision.real_dtype)
+
+
+    def generate_time_and_freq_vector(self):
+        time_vector_extra = np.arange(0, self.window_length_ms / 1000.0, 1 / self.sample_rate)
+        frequency_vector = np.fft.fftfreq(self.window_length_samples, d=1/self.sample_rate)
+        return time_vector_extra[:self.window_length_samples], frequency_vector  # Truncate extra samples from rounding
+
+
+class RawAcousticDataHandler:
+    """
+    TODO: Implement this to handle raw acoustic data
+    This class should be used to store all acoustic data that is generated from server threads
+    This class should interface in some way with the raw data GUI aspect
+    This class should provide functionality for exporting raw acoustic data
+    """
+    def __init__(self, number_lines: int = DEFAULT_NUMBER_LINES, number_lf_channels_per_line: int = NUMBER_LF_CHANNELS_PER_LINE, number_hf_channels_per_line: int = NUMBER_HF_CHANNELS_PER_LINE,
+                 precision: PrecisionEnum = DEFAULT_PRECISION):
+        self.number_lines = number_lines
+        self.number_lf_channels_per_line = number_lf_channels_per_line
+        self.number_hf_channels_per_line = number_hf_channels_per_line
+        self.total_sensors_per_line = self.number_lf_channels_per_line + self.number_hf_channels_per_line + self.number_lf_channels_per_line
+        self.precision = precision
+
+        # Create arrays for low frequency and high frequency sensor data
+        self.lf_channels = np.empty((self.number_lf_channels_per_line, 0), dtype=self.precision.real_dtype)
+        self.hf_channels = np.empty((self.number_hf_channels_per_line, 0), dtype=self.precision.real_dtype)
+
+        # Create data cache for all samples
+        self.sample_data = np.empty((self.number_lines, self.total_sensors_per_line, 0), dtype=self.precision.real_dtype)
+
+    def add_to_channels(self, new_sample_data: npt.NDArray):
+        # First verify size of array
+        if new_sample_data.shape[0] != self.number_lines or new_sample_data.shape[1] != self.total_sensors_per_line:
+            raise RuntimeError(f"Sample data shape does not match expected shape. Expected ({self.number_lines},{self.total_sensors_per_line},n) but got {new_sample_data.shape}")
+
+        # Append data to cached sample data
+        self.sample_data = np.concatenate((self.sample_data, new_sample_data), axis=2, dtype=self.precision.real_dtype)
+
+    def clear(self):
+        """Drops all cached sample data"""
+        self.sample_data = np.empty((self.number_lines, self.total_sensors_per_line, 0), dtype=self.precision.real_dtype)
+
+    def get_channel_data(self, sensor_number: Tuple[int, int]):
+        if sensor_number[0] >= DEFAULT_NUMBER_LINES or sensor_number[1] >= DEFAULT_TOTAL_SENSORS_PER_LINE:
+            RuntimeError(f"Trying to access samples for non existent sensor. Sensor array bounds are ({DEFAULT_NUMBER_LINES},{DEFAULT_TOTAL_SENSORS_PER_LINE}), tried to access ({sensor_number[0]},{sensor_number[1]})")
+        line_num = sensor_number[0]
+        sensor_number = sensor_number[1]
+        return self.sample_data[line_num][sensor_number]
+
+
+    def export_cached_acoustic_data(self, file_path: str, sample_rate: float = DEFAULT_SAMPLE_RATE_HF, chunk_samples: int = DEFAULT_SAMPLE_RATE_HF,
+                                    compression: ArchiveCompressionEnum = ArchiveCompressionEnum.ZLIB, quantization: ArchiveQuantizationEnum = ArchiveQuantizationEnum.NONE):
+        """
+        Exports all cached sample data to a compressed acoustic archive (see acoustic_archive.py)
+        :param file_path: Archive file to write
+        :param sample_rate: Sample rate of the cached data, stored in the archive index
+        :param chunk_samples: Samples per archive chunk, the unit of random access. Defaults to one second of data
+        :param compression: Compressor used for each channel block
+        :param quantization: Lossless float32 or int16/int24 quantization with per channel scale factors
+        """
+        with AcousticArchiveWriter(file_path, sample_rate, self.number_lines, self.total_sensors_per_line, compression, quantization) as writer:
+            for chunk_start in range(0, self.sample_data.shape[2], chunk_samples):
+                writer.write_block(self.sample_data[..., chunk_start:chunk_start + chunk_samples])
+
+
+##### Test functions #####
+def generate_sample_data():
+    per_line_array = []
+    for i in range(DEFAULT_TOTAL_SENSORS_PER_LINE):
+        per_line_array += DEFAULT_SAMPLE_RATE_HF * [float(i)]
+
+    per_line_array += per_line_array
+    data_array = np.array(per_line_array, dtype=np.float32)
+    return data_array
+
+
+def test_data_gen():
+    sample_rate = DEFAULT_SAMPLE_RATE_LF
+    signal_duration_s = 3.0  # 3 Second signal
+
+    t = np.linspace(0, signal_duration_s, int(signal_duration_s * sample_rate), endpoint=False)
+
+    # Signal 1
+    amplitude1 = 2.0
+    frequency1 = 440
+    signal1 = amplitude1 * np.sin(2 * np.pi * frequency1 * t)
+
+    # Signal 2
+    amplitude2 = 1.0
+    frequency2 = 800
+    signal2 = amplitude2 * np.sin(2 * np.pi * frequency2 * t)
+
+    # Noise
+    noise_signal = np.random.normal(0, 1, len(t))
+
+    # Generate full signal
+    signal_samples = signal1 + signal2 + noise_signal
+
+    return sample_rate, signal_samples
+
+
+def verify_precision_accuracy(windowing_function=WindowingFunctionEnum.HANNING):
+    """
+    Checks the float32 FFT path against the float64 reference on the test signal
+    :return: Max amplitude error relative to the reference peak. Raises RuntimeError if above FLOAT32_FFT_ACCURACY_BOUND
+    """
+    sample_rate, signal_samples = test_data_gen()
+
+    spectra = {}
+    for precision in PrecisionEnum:
+        fft_handler = FftHandler(sample_rate, precision=precision)
+        fft_handler.set_windowing_function(windowing_function)
+        spectra[precision] = np.array([np.abs(fft_data) for _, fft_data in fft_handler.compute_spectra(signal_samples)])
+
+    single, reference = spectra[PrecisionEnum.SINGLE], spectra[PrecisionEnum.DOUBLE]
+    if single.dtype != np.float32:
+        raise RuntimeError(f"float32 path was upcast to {single.dtype}")
+
+    relative_error = float(np.max(np.abs(single - reference)) / np.max(reference))
+    if relative_error > FLOAT32_FFT_ACCURACY_BOUND:
+        raise RuntimeError(f"float32 FFT error {relative_error:.2e} exceeds bound {FLOAT32_FFT_ACCURACY_BOUND:.0e}")
+    return relative_error
+
+if __name__ == "__main__":
+    # Instantiate headless acoustic processor
+    acoustic_processor = AcousticProcessor(DEFAULT_SAMPLE_RATE_HF)
+
+    # Generate test data for samples
+    array_samples = generate_sample_data()
+
+    acoustic_processor.retrieve_acoustic_data(array_samples)
+    acoustic_processor.retrieve_acoustic_data(array_samples)
+
+    sensor_tuple = (0, 0)
+    channel_data = acoustic_processor.raw_data_handler.get_channel_data(sensor_tuple)
+    print(f"Channel data: {channel_data}")
+    print(f"float32 FFT relative error: {verify_precision_accuracy():.2e}")
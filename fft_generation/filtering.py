@@ -0,0 +1,144 @@
+"""
+Streaming filter stages for the processing pipeline (see pipeline.py).
+Both stages filter every channel of a (..., samples) block, e.g. the full (lines, sensors, samples) message, with a few
+vectorized calls per block. Per channel state is carried between blocks, so chunk boundaries are seamless.
+"""
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+from numpy.lib.stride_tricks import sliding_window_view
+import scipy.fft
+from scipy import signal
+
+from fft_generation.acoustic_core import DEFAULT_PRECISION, DEFAULT_FFT_WORKERS, PrecisionEnum
+from fft_generation.pipeline import PipelineStage
+
+DEFAULT_FIR_TAPS = 255
+DEFAULT_IIR_ORDER = 4
+
+
+##### Filter design #####
+def design_fir_highpass(cutoff_hz: float, sample_rate: float, number_taps: int = DEFAULT_FIR_TAPS) -> npt.NDArray:
+    """Windowed-sinc high-pass FIR taps. Number of taps is forced odd, as a high-pass needs a type I filter"""
+    return signal.firwin(number_taps | 1, cutoff_hz, pass_zero="highpass", fs=sample_rate)
+
+
+def design_fir_bandpass(low_hz: float, high_hz: float, sample_rate: float, number_taps: int = DEFAULT_FIR_TAPS) -> npt.NDArray:
+    """Windowed-sinc band-pass FIR taps"""
+    return signal.firwin(number_taps, [low_hz, high_hz], pass_zero="bandpass", fs=sample_rate)
+
+
+def design_iir_highpass(cutoff_hz: float, sample_rate: float, order: int = DEFAULT_IIR_ORDER) -> npt.NDArray:
+    """Butterworth high-pass as second order sections"""
+    return signal.butter(order, cutoff_hz, btype="highpass", fs=sample_rate, output="sos")
+
+
+def design_iir_bandpass(low_hz: float, high_hz: float, sample_rate: float, order: int = DEFAULT_IIR_ORDER) -> npt.NDArray:
+    """Butterworth band-pass as second order sections"""
+    return signal.butter(order, [low_hz, high_hz], btype="bandpass", fs=sample_rate, output="sos")
+
+
+##### Filter stages #####
+class FirFilterStage(PipelineStage):
+    """
+    FIR filter using FFT overlap-save, suited to long filters
+    All segments of all channels in a block go through a single rfft/irfft pair. The last (taps - 1) input samples of each
+    channel are kept so the next block continues exactly where this one stopped. Filtering runs at the given precision
+    """
+    def __init__(self, taps: npt.NDArray, fft_length: Optional[int] = None, precision: PrecisionEnum = DEFAULT_PRECISION, fft_workers: int = DEFAULT_FFT_WORKERS):
+        self.precision = precision
+        self.fft_workers = fft_workers
+        self.taps = np.asarray(taps)
+        self.history_length = len(self.taps) - 1
+
+        # Each FFT of fft_length samples produces fft_length - history_length valid output samples
+        self.fft_length = fft_length if fft_length is not None else scipy.fft.next_fast_len(4 * len(self.taps), real=True)
+        if self.fft_length < len(self.taps):
+            raise RuntimeError(f"FFT length ({self.fft_length}) must be at least the number of taps ({len(self.taps)})")
+        self.segment_step = self.fft_length - self.history_length
+
+        self.taps_spectrum = scipy.fft.rfft(self.taps, self.fft_length).astype(precision.complex_dtype)
+        self.history = None  # (..., history_length) input samples from the previous block
+
+    def process(self, block):
+        channel_shape, number_samples = block.shape[:-1], block.shape[-1]
+        if self.history is None or self.history.shape[:-1] != channel_shape:
+            self.history = np.zeros(channel_shape + (self.history_length,), dtype=self.precision.real_dtype)
+
+        if number_samples == 0:
+            # Nothing to filter, history is unchanged
+            yield np.empty(block.shape, dtype=self.precision.real_dtype)
+            return
+
+        # Work buffer is previous history + new block, zero padded to a whole number of segments
+        number_segments = -(-number_samples // self.segment_step)
+        work = np.zeros(channel_shape + (self.history_length + number_segments * self.segment_step,), dtype=self.precision.real_dtype)
+        work[..., :self.history_length] = self.history
+        work[..., self.history_length:self.history_length + number_samples] = block
+
+        # Overlapping segments as a strided view, (..., segments, fft_length)
+        segments = sliding_window_view(work, self.fft_length, axis=-1)[..., ::self.segment_step, :]
+        segment_spectra = scipy.fft.rfft(segments, axis=-1, workers=self.fft_workers)
+        segment_spectra *= self.taps_spectrum
+        filtered = scipy.fft.irfft(segment_spectra, self.fft_length, axis=-1, workers=self.fft_workers)
+
+        # Discard the circularly wrapped samples at the start of each segment
+        output = filtered[..., self.history_length:].reshape(channel_shape + (-1,))[..., :number_samples]
+
+        self.history = work[..., number_samples:number_samples + self.history_length].copy()
+        yield output
+
+    def reset(self):
+        self.history = None
+
+
+class IirFilterStage(PipelineStage):
+    """
+    IIR filter using second order sections
+    Uses one sosfilt call over the whole block, keeping the filter delay state (zi) of every channel between blocks.
+    State is initialised to the steady state response of the first sample to avoid a start up transient.
+    Coefficients and state stay float64 whatever the precision, as low cutoff sections lose accuracy badly in float32.
+    Only the output samples are in the precision's dtype
+    """
+    def __init__(self, sos: npt.NDArray, precision: PrecisionEnum = DEFAULT_PRECISION):
+        self.precision = precision
+        self.sos = np.asarray(sos, dtype=np.float64)
+        self.zi = None  # (sections, ..., 2) float64 filter state
+
+    def process(self, block):
+        channel_shape = block.shape[:-1]
+        if block.shape[-1] == 0:
+            # Nothing to filter, and no first sample to initialise the state from
+            yield np.empty(block.shape, dtype=self.precision.real_dtype)
+            return
+
+        if self.zi is None or self.zi.shape[1:-1] != channel_shape:
+            steady_state = signal.sosfilt_zi(self.sos)  # (sections, 2) for a unit step
+            self.zi = (steady_state.reshape((steady_state.shape[0],) + (1,) * len(channel_shape) + (2,)) * block[..., :1]).astype(np.float64)
+
+        output, self.zi = signal.sosfilt(self.sos, block, axis=-1, zi=self.zi)
+        yield output.astype(self.precision.real_dtype, copy=False)
+
+    def reset(self):
+        self.zi = None
+
+
+if __name__ == "__main__":
+    from fft_generation.acoustic_core import DEFAULT_SAMPLE_RATE_HF, DEFAULT_NUMBER_LINES, DEFAULT_TOTAL_SENSORS_PER_LINE
+
+    rng = np.random.default_rng(0)
+    test_signal = rng.normal(0, 1, (DEFAULT_NUMBER_LINES, DEFAULT_TOTAL_SENSORS_PER_LINE, 4 * DEFAULT_SAMPLE_RATE_HF)).astype(np.float32)
+    block_edges = [0, 1000, 5120, 5121, 12000, test_signal.shape[-1]]
+
+    fir_taps = design_fir_highpass(50, DEFAULT_SAMPLE_RATE_HF)
+    fir_stage = FirFilterStage(fir_taps)
+    fir_streamed = np.concatenate([next(fir_stage.process(test_signal[..., start:stop])) for start, stop in zip(block_edges, block_edges[1:])], axis=-1)
+    fir_reference = signal.lfilter(fir_taps, 1.0, test_signal, axis=-1)
+    print(f"FIR max error vs lfilter: {np.max(np.abs(fir_streamed - fir_reference)):.2e}")
+
+    sos = design_iir_bandpass(100, 1500, DEFAULT_SAMPLE_RATE_HF)
+    iir_stage = IirFilterStage(sos)
+    iir_streamed = np.concatenate([next(iir_stage.process(test_signal[..., start:stop])) for start, stop in zip(block_edges, block_edges[1:])], axis=-1)
+    iir_reference = signal.sosfilt(sos, test_signal, axis=-1, zi=signal.sosfilt_zi(sos)[:, None, None, :] * test_signal[..., :1])[0]
+    print(f"IIR max error vs single sosfilt: {np.max(np.abs(iir_streamed - iir_reference)):.2e}")
@@ -0,0 +1,341 @@
+"""
+Streaming pipeline for composing acoustic processing stages.
+A pipeline is a list of stages. Each stage receives one block and yields zero or more blocks for the next stage, so the
+same graph can be driven live (Pipeline.push from a message handler) or offline (Pipeline.run/stream over a source).
+
+Blocks handed between stages are views wherever possible (reshape, strided slices, memmap/socket buffers). A view is only
+valid until the stage that produced it is called again, so any sink that wants to keep a block must copy it.
+"""
+import socket
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import scipy.fft
+
+from fft_generation.acoustic_core import (
+    DEFAULT_NUMBER_LINES, DEFAULT_TOTAL_SENSORS_PER_LINE, TOTAL_SAMPLES_PER_MESSAGE, DEFAULT_PRECISION, DEFAULT_FFT_WORKERS,
+    WindowingFunctionEnum, PrecisionEnum, generate_window,
+)
+
+
+class StageTiming:
+    """Accumulated processing time for a single stage. Time spent in downstream stages is not included"""
+    def __init__(self, name: str):
+        self.name = name
+        self.total_seconds = 0.0
+        self.blocks_in = 0
+        self.blocks_out = 0
+
+    @property
+    def mean_seconds_per_block(self) -> float:
+        return self.total_seconds / self.blocks_in if self.blocks_in else 0.0
+
+    def reset(self):
+        self.total_seconds = 0.0
+        self.blocks_in = 0
+        self.blocks_out = 0
+
+    def __repr__(self):
+        return f"{self.name}: {self.blocks_in} in, {self.blocks_out} out, {self.total_seconds * 1000:.3f} ms total"
+
+
+class PipelineStage:
+    """
+    Base class for pipeline stages
+    Subclasses implement "process", which takes one block and returns an iterable (usually a generator) of output blocks
+    """
+    def process(self, block) -> Iterable:
+        raise NotImplementedError(f"{type(self).__name__} must implement process")
+
+    def reset(self):
+        """Clears any state carried between blocks"""
+        pass
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+
+class Pipeline:
+    """
+    Runs blocks through an ordered list of stages and keeps per-stage timing
+    Final stage outputs are passed to "sink" when pushing, or yielded when streaming
+    """
+    def __init__(self, stages: Sequence[PipelineStage], sink: Optional[Callable[[object], None]] = None):
+        self.stages = list(stages)
+        self.sink = sink
+        self.stage_timings = [StageTiming(stage.name) for stage in self.stages]
+
+    def push(self, block):
+        """Pushes a single block through the pipeline (live mode). Final outputs go to the sink"""
+        for output in self._propagate(0, block):
+            if self.sink is not None:
+                self.sink(output)
+
+    def stream(self, source: Iterable) -> Iterator:
+        """Pulls every block from the source through the pipeline (offline mode), yielding final outputs"""
+        for block in source:
+            yield from self._propagate(0, block)
+
+    def run(self, source: Iterable):
+        """Pulls every block from the source through the pipeline, passing final outputs to the sink"""
+        for output in self.stream(source):
+            if self.sink is not None:
+                self.sink(output)
+
+    def reset(self):
+        for stage, timing in zip(self.stages, self.stage_timings):
+            stage.reset()
+            timing.reset()
+
+    def timings(self) -> List[StageTiming]:
+        return self.stage_timings
+
+    def _propagate(self, stage_index: int, block) -> Iterator:
+        if stage_index == len(self.stages):
+            yield block
+            return
+
+        timing = self.stage_timings[stage_index]
+        timing.blocks_in += 1
+        outputs = iter(self.stages[stage_index].process(block))
+        while True:
+            # Only time the stage itself, not the downstream stages run while it is suspended
+            start = time.perf_counter()
+            try:
+                output = next(outputs)
+            except StopIteration:
+                timing.total_seconds += time.perf_counter() - start
+                return
+            timing.total_seconds += time.perf_counter() - start
+            timing.blocks_out += 1
+            yield from self._propagate(stage_index + 1, output)
+
+
+##### Sources #####
+class GeneratorSource:
+    """Source that calls a block generating function, e.g. generate_sample_data. Runs forever if count is None"""
+    def __init__(self, generate_block: Callable[[], npt.NDArray], count: Optional[int] = None):
+        self.generate_block = generate_block
+        self.count = count
+
+    def __iter__(self):
+        blocks_generated = 0
+        while self.count is None or blocks_generated < self.count:
+            yield self.generate_block()
+            blocks_generated += 1
+
+
+class FileReplaySource:
+    """
+    Source that replays a raw interleaved sample file, one message at a time
+    The file is memory mapped, so each block is a view into the file rather than a copy
+    """
+    def __init__(self, file_path: str, samples_per_block: int = TOTAL_SAMPLES_PER_MESSAGE, dtype: npt.DTypeLike = np.float32):
+        self.file_path = file_path
+        self.samples_per_block = samples_per_block
+        self.dtype = dtype
+
+    def __iter__(self):
+        file_samples = np.memmap(self.file_path, dtype=self.dtype, mode="r")
+        total_blocks = len(file_samples) // self.samples_per_block  # Trailing partial message is ignored
+        for block_number in range(total_blocks):
+            start = block_number * self.samples_per_block
+            yield file_samples[start:start + self.samples_per_block]
+
+
+class SocketSource:
+    """
+    Source that reads fixed size messages from a connected socket
+    Receives directly into one preallocated buffer, so each yielded block is only valid until the next one is read
+    """
+    def __init__(self, connection: socket.socket, samples_per_block: int = TOTAL_SAMPLES_PER_MESSAGE, dtype: npt.DTypeLike = np.float32):
+        self.connection = connection
+        self.dtype = np.dtype(dtype)
+        self.buffer = bytearray(samples_per_block * self.dtype.itemsize)
+        self.block = np.frombuffer(self.buffer, dtype=self.dtype)
+
+    def __iter__(self):
+        buffer_view = memoryview(self.buffer)
+        while True:
+            bytes_read = 0
+            while bytes_read < len(self.buffer):
+                received = self.connection.recv_into(buffer_view[bytes_read:])
+                if received == 0:
+                    # Connection closed, drop any partial message
+                    return
+                bytes_read += received
+            yield self.block
+
+
+##### Stages #####
+class DeinterleaveStage(PipelineStage):
+    """Reshapes a flat message into (lines, sensors, samples). Returns a view, no data is copied"""
+    def __init__(self, number_lines: int = DEFAULT_NUMBER_LINES, total_sensors_per_line: int = DEFAULT_TOTAL_SENSORS_PER_LINE):
+        self.number_lines = number_lines
+        self.total_sensors_per_line = total_sensors_per_line
+
+    def process(self, block):
+        yield np.reshape(block, (self.number_lines, self.total_sensors_per_line, -1))
+
+
+class DecimateStage(PipelineStage):
+    """
+    Keeps every "factor"th sample along the last axis, tracking the phase across blocks of any size
+    Output is a strided view. This does no anti-alias filtering, so put a low-pass filter stage in front of it
+    """
+    def __init__(self, factor: int):
+        if factor < 1:
+            raise RuntimeError(f"Decimation factor must be at least 1, got {factor}")
+        self.factor = factor
+        self.offset = 0  # Index of the first sample to keep in the next block
+
+    def process(self, block):
+        decimated = block[..., self.offset::self.factor]
+        self.offset = (self.offset - block.shape[-1]) % self.factor
+        if decimated.shape[-1] > 0:
+            yield decimated
+
+    def reset(self):
+        self.offset = 0
+
+
+class StftStage(PipelineStage):
+    """
+    Short time Fourier transform over every channel of a (..., samples) block
+    Samples are copied once into a preallocated buffer so windows can span blocks. Yields a complex (..., bins) one-sided
+    spectrum for every window. If "sensors" is given, only those (line, sensor) pairs are transformed and the output is (sensors, bins)
+    Samples are stored and transformed at the given precision, and every channel's window goes through one multithreaded rfft call
+    """
+    def __init__(self, sample_rate: float, window_length_samples: int, hop_length: int, windowing_function=WindowingFunctionEnum.HANNING,
+                 sensors: Optional[Sequence[Tuple[int, int]]] = None, precision: PrecisionEnum = DEFAULT_PRECISION, fft_workers: int = DEFAULT_FFT_WORKERS):
+        if hop_length < 1:
+            raise RuntimeError(f"Hop length must be at least 1 sample, got {hop_length}")
+
+        self.sample_rate = sample_rate
+        self.window_length_samples = window_length_samples
+        self.hop_length = hop_length
+        self.precision = precision
+        self.fft_workers = fft_workers
+        self.windowing_coefficients = generate_window(windowing_function, window_length_samples, precision.real_dtype)
+        self.frequency_vector = np.fft.rfftfreq(window_length_samples, d=1 / sample_rate)
+
+        # Fancy index for sensor selection, None means transform the full block
+        self.sensor_index = tuple(np.array(sensors).T) if sensors is not None else None
+
+        # Buffers are allocated on the first block, once the channel shape is known
+        self.buffer = None
+        self.windowed = None
+        self.buffered_samples = 0
+        self.samples_to_skip = 0  # Samples of a hop larger than the window still to be skipped from the next block
+
+    def process(self, block):
+        if self.sensor_index is not None:
+            block = block[self.sensor_index]
+        # Drop samples that fall in the gap between windows when hop_length > window_length_samples
+        skipped = min(self.samples_to_skip, block.shape[-1])
+        block = block[..., skipped:]
+        self.samples_to_skip -= skipped
+
+        number_new_samples = block.shape[-1]
+        self.ensure_buffer(block.shape[:-1], self.precision.real_dtype, number_new_samples)
+
+        self.buffer[..., self.buffered_samples:self.buffered_samples + number_new_samples] = block
+        self.buffered_samples += number_new_samples
+
+        window_start = 0
+        while window_start + self.window_length_samples <= self.buffered_samples:
+            np.multiply(self.buffer[..., window_start:window_start + self.window_length_samples], self.windowing_coefficients, out=self.windowed)
+            yield scipy.fft.rfft(self.windowed, axis=-1, workers=self.fft_workers)
+            window_start += self.hop_length
+
+        # Move leftover samples to the front of the buffer for the next block
+        self.samples_to_skip += max(window_start - self.buffered_samples, 0)
+        leftover = max(self.buffered_samples - window_start, 0)
+        if leftover:
+            self.buffer[..., :leftover] = self.buffer[..., window_start:self.buffered_samples]
+        self.buffered_samples = leftover
+
+    def ensure_buffer(self, channel_shape: Tuple[int, ...], dtype, number_new_samples: int):
+        capacity = self.window_length_samples + number_new_samples
+        if self.buffer is not None and self.buffer.shape[:-1] == channel_shape and self.buffer.shape[-1] >= capacity:
+            return
+
+        new_buffer = np.empty(channel_shape + (capacity,), dtype=dtype)
+        if self.buffer is not None and self.buffer.shape[:-1] == channel_shape:
+            new_buffer[..., :self.buffered_samples] = self.buffer[..., :self.buffered_samples]
+        else:
+            self.buffered_samples = 0
+        self.buffer = new_buffer
+        self.windowed = np.empty(channel_shape + (self.window_length_samples,), dtype=dtype)
+
+    def reset(self):
+        self.buffered_samples = 0
+        self.samples_to_skip = 0
+
+
+class PsdStage(PipelineStage):
+    """
+    Converts STFT output to a one-sided power spectral density (units^2/Hz), averaging "averages" frames (Welch's method)
+    Yields a view of a preallocated accumulator once per "averages" frames
+    """
+    def __init__(self, sample_rate: float, windowing_coefficients: npt.NDArray, averages: int = 1):
+        self.averages = averages
+        self.scale = 1.0 / (sample_rate * np.sum(np.square(windowing_coefficients)))
+        self.window_length_samples = len(windowing_coefficients)
+        self.accumulator = None
+        self.output = None
+        self.frames_accumulated = 0
+
+    def process(self, spectrum):
+        if self.accumulator is None or self.accumulator.shape != spectrum.shape:
+            self.accumulator = np.zeros(spectrum.shape, dtype=spectrum.real.dtype)
+            self.output = np.empty_like(self.accumulator)
+            self.frames_accumulated = 0
+
+        self.accumulator += np.square(spectrum.real) + np.square(spectrum.imag)
+        self.frames_accumulated += 1
+        if self.frames_accumulated < self.averages:
+            return
+
+        np.multiply(self.accumulator, self.scale / self.frames_accumulated, out=self.output)
+        # One-sided spectrum, double everything but DC (and Nyquist for even lengths)
+        last_doubled = -1 if self.window_length_samples % 2 == 0 else None
+        self.output[..., 1:last_doubled] *= 2
+        self.accumulator.fill(0)
+        self.frames_accumulated = 0
+        yield self.output
+
+    def reset(self):
+        self.accumulator = None
+        self.frames_accumulated = 0
+
+
+class DetectStage(PipelineStage):
+    """
+    Flags bins whose PSD exceeds the channel's median noise floor by "threshold_db"
+    Yields the np.nonzero indices of the detections, (channel index..., bin index), for blocks with at least one detection
+    """
+    def __init__(self, threshold_db: float = 10.0):
+        self.threshold_ratio = 10 ** (threshold_db / 10)
+
+    def process(self, psd):
+        noise_floor = np.median(psd, axis=-1, keepdims=True)
+        detections = np.nonzero(psd > noise_floor * self.threshold_ratio)
+        if len(detections[-1]) > 0:
+            yield detections
+
+
+if __name__ == "__main__":
+    from fft_generation.acoustic_core import DEFAULT_SAMPLE_RATE_HF, generate_sample_data
+
+    window_length = 512
+    stft = StftStage(DEFAULT_SAMPLE_RATE_HF, window_length, window_length // 2)
+    pipeline = Pipeline([DeinterleaveStage(), stft, PsdStage(DEFAULT_SAMPLE_RATE_HF, stft.windowing_coefficients, averages=4)])
+
+    psd_count = sum(1 for _ in pipeline.stream(GeneratorSource(generate_sample_data, count=5)))
+    print(f"PSDs computed: {psd_count}")
+    for timing in pipeline.timings():
+        print(timing)
@@ -0,0 +1,95 @@
+"""
+Bounded history of computed spectra, so the live view can be frozen and scrubbed back without recomputing FFTs.
+"""
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+DEFAULT_HISTORY_SPECTRA = 600  # Maximum spectra kept (e.g. 60 s of FFTs every 100 ms)
+DEFAULT_HISTORY_MEMORY_BYTES = 64 * 1024 * 1024  # Memory cap for the spectrum storage
+TIMESTAMP_DTYPE = np.dtype(np.float64)
+
+
+class SpectrumHistory:
+    """
+    Ring buffer of the most recent magnitude and phase spectra and their timestamps
+    Storage is preallocated once the spectrum length is known, and capacity is the smaller of "max_spectra" and what fits in
+    "memory_limit_bytes". The oldest spectrum is evicted when full.
+    float16 storage halves memory but only holds values up to 65504, so use it for normalised or dB magnitudes (phase always fits).
+
+    Spectra are addressed by age, 0 being the newest. While frozen, ages are relative to the newest spectrum at the time of
+    freezing, so scrubbing is stable while new spectra keep being recorded (until the frozen ones get evicted)
+    """
+    def __init__(self, max_spectra: int = DEFAULT_HISTORY_SPECTRA, memory_limit_bytes: int = DEFAULT_HISTORY_MEMORY_BYTES, dtype: npt.DTypeLike = np.float32):
+        self.max_spectra = max_spectra
+        self.memory_limit_bytes = memory_limit_bytes
+        self.dtype = np.dtype(dtype)
+
+        # Allocated on the first spectrum, and again whenever the spectrum length changes
+        self.frequency_vector = None
+        self.magnitudes = None
+        self.phases = None
+        self.timestamps = None
+        self.capacity = 0
+
+        self.total_appended = 0  # Absolute index of the next spectrum
+        self.frozen_count = None  # Value of total_appended when frozen, None when live
+
+    def append(self, frequency_vector: npt.NDArray, magnitude: npt.NDArray, phase: npt.NDArray, timestamp: Optional[float] = None):
+        """Stores one magnitude/phase spectrum, evicting the oldest if full"""
+        if self.magnitudes is None or self.magnitudes.shape[1] != len(magnitude):
+            self.allocate(len(magnitude))
+        self.frequency_vector = frequency_vector
+
+        slot = self.total_appended % self.capacity
+        self.magnitudes[slot] = magnitude
+        self.phases[slot] = phase
+        self.timestamps[slot] = time.time() if timestamp is None else timestamp
+        self.total_appended += 1
+
+    def allocate(self, number_bins: int):
+        bytes_per_spectrum = 2 * number_bins * self.dtype.itemsize + TIMESTAMP_DTYPE.itemsize  # Magnitude, phase and timestamp
+        self.capacity = max(1, min(self.max_spectra, self.memory_limit_bytes // bytes_per_spectrum))
+        self.magnitudes = np.zeros((self.capacity, number_bins), dtype=self.dtype)
+        self.phases = np.zeros((self.capacity, number_bins), dtype=self.dtype)
+        self.timestamps = np.zeros(self.capacity, dtype=TIMESTAMP_DTYPE)
+
+        # Old spectra have a different length and are no longer comparable, start over
+        self.total_appended = 0
+        if self.frozen_count is not None:
+            self.frozen_count = 0
+
+    def freeze(self):
+        self.frozen_count = self.total_appended
+
+    def unfreeze(self):
+        self.frozen_count = None
+
+    @property
+    def is_frozen(self) -> bool:
+        return self.frozen_count is not None
+
+    def __len__(self):
+        """Number of spectra available for scrubbing, from the newest (or the frozen newest) back to the oldest kept"""
+        reference = self.total_appended if self.frozen_count is None else self.frozen_count
+        oldest_kept = max(0, self.total_appended - self.capacity)
+        return max(0, reference - oldest_kept)
+
+    def get(self, age: int = 0) -> Tuple[float, npt.NDArray, npt.NDArray, npt.NDArray]:
+        """
+        Returns a stored spectrum without any recomputation
+        :param age: 0 for the newest spectrum, 1 for the one before it, etc.
+        :return: (timestamp, frequency vector, float32 magnitude, float32 phase)
+        """
+        if age < 0 or age >= len(self):
+            raise IndexError(f"Spectrum age {age} is not in the history, {len(self)} spectra available")
+
+        reference = self.total_appended if self.frozen_count is None else self.frozen_count
+        slot = (reference - 1 - age) % self.capacity
+        return float(self.timestamps[slot]), self.frequency_vector, self.magnitudes[slot].astype(np.float32), self.phases[slot].astype(np.float32)
+
+    def clear(self):
+        self.total_appended = 0
+        self.frozen_count = None
@@ -2,7 +2,11 @@ import numpy as np
 from PySide6.QtCore import Slot, QAbstractTableModel
 from PySide6.QtWidgets import QApplication, QMainWindow
 from ui_generated.acoustic_vis import Ui_MainWindow
-from fft_generation.fft_handler import FftHandler, AcousticHandler, SampleSignalGenerator
+from fft_generation.fft_handler import FftHandler, AcousticHandler, SampleSignalGenerator, DEFAULT_SAMPLE_RATE_HF
+from viewbox_handler import MultiChannelPlotWidget
+
+DASHBOARD_LINE = 0  # Hydrophone line shown in the raw data dashboard
+DASHBOARD_CHANNELS = 32  # Number of channels from that line shown in the raw data dashboard
 
 class TableModel(QAbstractTableModel):
     def __init__(self, number_hydrophone_lines: int, number_channels_per_line: int):
@@ -33,6 +37,15 @@ class RawDataVisualize(QMainWindow, Ui_MainWindow):
         self.model = TableModel(self.acoustic_handler.number_lines, self.acoustic_handler.total_sensors_per_line)
         self.sample_data_table.setModel(self.model)
 
+        # Dashboard of raw traces for many channels, drawn in a single plot widget
+        channel_labels = [f"L{DASHBOARD_LINE}-CH{sensor_num}" for sensor_num in range(DASHBOARD_CHANNELS)]
+        self.raw_dashboard = MultiChannelPlotWidget("Time (s)", channel_labels, DEFAULT_SAMPLE_RATE_HF)
+        self.verticalLayout.addWidget(self.raw_dashboard.widget_container)
+        self.acoustic_handler.raw_data_signal.connect(self.update_raw_dashboard)
+
+    def update_raw_dashboard(self, data_per_sample):
+        self.raw_dashboard.append_data(data_per_sample[DASHBOARD_LINE, :DASHBOARD_CHANNELS])
+
 
     # def generate_column_headers(self):
     #     total_column_count = 1 + (self.acoustic_handler.number_lines * self.acoustic_handler.total_sensors_per_line)  # +1 because of "Sample Number" column
@@ -1,5 +1,6 @@
 import numpy as np
-from PySide6.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget, QHBoxLayout, QSlider, QLabel
 from viewbox_handler import GeneralPlotWidget
 from ui_generated.grapher import Ui_MainWindow
 from fft_generation.fft_handler import FftHandler, AcousticHandler, test_data_gen
@@ -20,18 +21,67 @@ class AudioFFTApp(QMainWindow, Ui_MainWindow):
         self.phase_plot_widget = GeneralPlotWidget("Frequency (Hz)", "Phase")
 
         self.acoustic_handler = AcousticHandler(self.sample_rate)
-        self.acoustic_handler.fft_amplitude.connect(self.amplitude_plot_widget.set_data)
-        self.acoustic_handler.fft_phase.connect(self.phase_plot_widget.set_data)
+        self.acoustic_handler.fft_amplitude.connect(self.show_live_amplitude)
+        self.acoustic_handler.fft_phase.connect(self.show_live_phase)
+        self.spectrum_history = self.acoustic_handler.fft_handler.spectrum_history
 
         # Add to layout
         self.verticalLayout.addWidget(self.amplitude_plot_widget.widget_container)
         self.verticalLayout.addWidget(self.phase_plot_widget.widget_container)
 
+        # Freeze button and scrub slider for cached amplitude and phase spectra. Slider position 0 is the oldest cached spectrum
+        scrub_layout = QHBoxLayout()
+        self.freeze_button = QPushButton("Freeze")
+        self.freeze_button.setCheckable(True)
+        self.freeze_button.toggled.connect(self.set_frozen)
+        self.scrub_slider = QSlider(Qt.Orientation.Horizontal)
+        self.scrub_slider.setEnabled(False)
+        self.scrub_slider.valueChanged.connect(self.show_cached_spectrum)
+        self.scrub_label = QLabel("Live")
+        scrub_layout.addWidget(self.freeze_button)
+        scrub_layout.addWidget(self.scrub_slider)
+        scrub_layout.addWidget(self.scrub_label)
+        self.verticalLayout.addLayout(scrub_layout)
+
         #### Generate test data #####
         button = QPushButton("Add Signal data")
         self.verticalLayout.addWidget(button)
         button.clicked.connect(self.generate_signal)
 
+    def show_live_amplitude(self, x_data, y_data):
+        if not self.spectrum_history.is_frozen:
+            self.amplitude_plot_widget.set_data(x_data, y_data)
+
+    def show_live_phase(self, x_data, y_data):
+        if not self.spectrum_history.is_frozen:
+            self.phase_plot_widget.set_data(x_data, y_data)
+
+    def set_frozen(self, frozen: bool):
+        if not frozen:
+            self.spectrum_history.unfreeze()
+            self.scrub_slider.setEnabled(False)
+            self.scrub_label.setText("Live")
+            return
+
+        self.spectrum_history.freeze()
+        newest_position = max(len(self.spectrum_history) - 1, 0)
+        self.scrub_slider.setRange(0, newest_position)
+        self.scrub_slider.setValue(newest_position)
+        self.scrub_slider.setEnabled(len(self.spectrum_history) > 0)
+        self.show_cached_spectrum(newest_position)
+
+    def show_cached_spectrum(self, slider_position: int):
+        if not self.spectrum_history.is_frozen or len(self.spectrum_history) == 0:
+            return
+
+        # Older frozen spectra may have been evicted since freezing
+        age = min(self.scrub_slider.maximum() - slider_position, len(self.spectrum_history) - 1)
+        timestamp, frequency_vector, amplitude, phase = self.spectrum_history.get(age)
+        newest_timestamp = self.spectrum_history.get(0)[0]
+        self.amplitude_plot_widget.set_data(frequency_vector, amplitude)
+        self.phase_plot_widget.set_data(frequency_vector, phase)
+        self.scrub_label.setText(f"-{newest_timestamp - timestamp:.2f} s")
+
     def generate_signal(self):
         # Generate signal and send to FFT Handler
         samples_to_read = self.acoustic_handler.fft_handler.window_length_samples
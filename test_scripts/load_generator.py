@@ -0,0 +1,127 @@
+"""
+Synthetic multi-channel array load generator.
+Produces acoustic data messages shaped like the real ones (flattened (lines, sensors, samples) float32) containing tonals,
+broadband noise and transients, with per sensor arrival delays for a plane wave hitting each line.
+Run from the repository root: python -m test_scripts.load_generator
+"""
+import queue
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from fft_generation.acoustic_core import DEFAULT_SAMPLE_RATE_HF, DEFAULT_NUMBER_LINES, DEFAULT_TOTAL_SENSORS_PER_LINE
+
+SOUND_SPEED_M_S = 1500.0  # Speed of sound in water
+DEFAULT_SENSOR_SPACING_M = 0.5
+DEFAULT_TRANSIENT_LENGTH_S = 0.02
+
+
+@dataclass
+class LoadGeneratorConfig:
+    sample_rate: float = DEFAULT_SAMPLE_RATE_HF
+    number_lines: int = DEFAULT_NUMBER_LINES
+    total_sensors_per_line: int = DEFAULT_TOTAL_SENSORS_PER_LINE
+    samples_per_message: int = DEFAULT_SAMPLE_RATE_HF  # One second of data per message, as with the real array
+    tonals: List[Tuple[float, float]] = field(default_factory=lambda: [(440.0, 0.2), (800.0, 0.1), (1250.0, 0.05)])  # (Hz, amplitude)
+    noise_std: float = 0.05  # Broadband noise standard deviation
+    transients_per_second: float = 0.5  # Mean rate of transients (Poisson)
+    transient_amplitude: float = 0.5
+    transient_frequency: float = 1800.0  # Carrier of the windowed tone burst transient
+    sensor_spacing_m: float = DEFAULT_SENSOR_SPACING_M
+    bearing_deg: float = 60.0  # Arrival angle relative to the line axis
+    seed: Optional[int] = None
+
+
+class SyntheticArrayGenerator:
+    """
+    Generates consecutive acoustic data messages. Phase is continuous from one message to the next
+    Every sensor sees the same sources delayed by its distance along the line projected onto the arrival direction
+    """
+    def __init__(self, config: Optional[LoadGeneratorConfig] = None):
+        config = config if config is not None else LoadGeneratorConfig()
+        self.config = config
+        self.rng = np.random.default_rng(config.seed)
+        self.samples_generated = 0
+
+        # Per sensor arrival delay in seconds, same for every line, shaped to broadcast against (lines, sensors, samples)
+        # Shifted so the first sensor reached has zero delay, bearings over 90 degrees would otherwise give negative delays
+        sensor_positions = np.arange(config.total_sensors_per_line) * config.sensor_spacing_m
+        arrival_delays = sensor_positions * np.cos(np.radians(config.bearing_deg)) / SOUND_SPEED_M_S
+        self.sensor_delays = (arrival_delays - np.min(arrival_delays))[np.newaxis, :, np.newaxis]
+        self.sensor_delay_samples = np.round(self.sensor_delays[0, :, 0] * config.sample_rate).astype(int)
+
+        # Transient waveform is precomputed, a Hann windowed tone burst
+        transient_samples = int(DEFAULT_TRANSIENT_LENGTH_S * config.sample_rate)
+        transient_time = np.arange(transient_samples) / config.sample_rate
+        self.transient = (config.transient_amplitude * np.hanning(transient_samples) * np.sin(2 * np.pi * config.transient_frequency * transient_time)).astype(np.float32)
+
+    def next_message(self) -> np.ndarray:
+        """Returns the next message as a flat float32 array, interleaved the same way as received acoustic data"""
+        config = self.config
+        shape = (config.number_lines, config.total_sensors_per_line, config.samples_per_message)
+        message = self.rng.normal(0, config.noise_std, shape).astype(np.float32)
+
+        # Tonals, delayed per sensor
+        sample_times = ((self.samples_generated + np.arange(config.samples_per_message)) / config.sample_rate)[np.newaxis, np.newaxis, :]
+        delayed_times = sample_times - self.sensor_delays
+        for frequency, amplitude in config.tonals:
+            # Wrap the phase in float64 so tonals stay clean after hours of samples, then take the sine in float32
+            phase = np.mod(2 * np.pi * frequency * delayed_times, 2 * np.pi).astype(np.float32)
+            message += np.float32(amplitude) * np.sin(phase)
+
+        # Transients, clipped at the message boundary
+        number_transients = self.rng.poisson(config.transients_per_second * config.samples_per_message / config.sample_rate)
+        for start_sample in self.rng.integers(0, config.samples_per_message, number_transients):
+            for sensor_number, delay_samples in enumerate(self.sensor_delay_samples):
+                sensor_start = start_sample + delay_samples
+                length = min(len(self.transient), config.samples_per_message - sensor_start)
+                if length > 0:
+                    message[:, sensor_number, sensor_start:sensor_start + length] += self.transient[:length]
+
+        self.samples_generated += config.samples_per_message
+        return message.reshape(-1)
+
+
+def run_load_generator(output_queue, stop_event, config: Optional[LoadGeneratorConfig] = None, rate_multiplier: float = 1.0,
+                       duration_s: Optional[float] = None, precomputed_messages: int = 0):
+    """
+    Producer loop, intended to run in its own process
+    Puts (sequence number, send time, message) on the queue at "rate_multiplier" times the real data rate. If the queue is full
+    the message is dropped, which shows up as a sequence gap on the consumer side. Puts None when finished
+    :param precomputed_messages: If non-zero, cycle through this many pregenerated messages so generation cost doesn't limit the rate
+    """
+    generator = SyntheticArrayGenerator(config)
+    config = generator.config
+    message_pool = [generator.next_message() for _ in range(precomputed_messages)]
+
+    message_period = config.samples_per_message / config.sample_rate / rate_multiplier
+    start_time = time.perf_counter()
+    sequence_number = 0
+    while not stop_event.is_set():
+        if duration_s is not None and time.perf_counter() - start_time >= duration_s:
+            break
+
+        message = message_pool[sequence_number % len(message_pool)] if message_pool else generator.next_message()
+
+        # Sleep until this message is due, never sleep to catch up
+        delay = start_time + sequence_number * message_period - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            output_queue.put_nowait((sequence_number, time.time(), message))
+        except queue.Full:
+            pass  # Dropped, consumer sees the gap
+        sequence_number += 1
+
+    output_queue.put(None)
+
+
+if __name__ == "__main__":
+    generator = SyntheticArrayGenerator(LoadGeneratorConfig(seed=0))
+    start = time.perf_counter()
+    messages = [generator.next_message() for _ in range(5)]
+    elapsed = time.perf_counter() - start
+    print(f"Generated {len(messages)} messages of {messages[0].nbytes / 1e6:.2f} MB in {elapsed:.3f} s ({len(messages) / elapsed:.1f}x real time)")
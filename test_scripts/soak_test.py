@@ -0,0 +1,150 @@
+"""
+Soak test harness. Drives AcousticHandler with synthetic array data from a separate load generator process and reports
+throughput, latency percentiles, memory growth and dropped messages.
+Run from the repository root, e.g. 4 hours at 2x the real data rate:
+    python -m test_scripts.soak_test --hours 4 --rate 2
+"""
+import argparse
+import multiprocessing
+import queue
+import resource
+import sys
+import time
+
+import numpy as np
+
+from fft_generation.acoustic_core import DEFAULT_SAMPLE_RATE_HF, DEFAULT_WINDOW_LENGTH_MS
+from fft_generation.fft_handler import AcousticHandler
+from fft_generation.filtering import IirFilterStage, design_iir_highpass
+from fft_generation.pipeline import Pipeline, StftStage, PsdStage
+from test_scripts.load_generator import LoadGeneratorConfig, run_load_generator
+
+DEFAULT_REPORT_INTERVAL_S = 60.0
+DEFAULT_QUEUE_SIZE = 8  # Messages buffered between the generator and the handler before the generator starts dropping
+DEFAULT_CACHE_SECONDS = 30  # Raw data cache is cleared after this many seconds of data, as it otherwise grows without bound
+QUEUE_TIMEOUT_S = 5.0
+HIGHPASS_CUTOFF_HZ = 20.0
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process. Uses /proc on Linux, falls back to the peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as statm_file:
+            return int(statm_file.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024  # macOS reports bytes, Linux reports KiB
+
+
+class SoakStatistics:
+    """Accumulates per message measurements and formats reports"""
+    def __init__(self, message_bytes: int, message_duration_s: float):
+        self.message_bytes = message_bytes
+        self.message_duration_s = message_duration_s
+        self.start_time = time.perf_counter()
+        self.baseline_rss = None  # Taken after the first message so imports and first allocations aren't counted as growth
+
+        self.messages_processed = 0
+        self.dropped_messages = 0
+        self.last_sequence_number = -1
+        self.latencies_s = []  # Generator send time to processing finished
+        self.processing_times_s = []
+
+    def record(self, sequence_number: int, send_time: float, processing_time_s: float):
+        self.dropped_messages += sequence_number - self.last_sequence_number - 1
+        self.last_sequence_number = sequence_number
+        self.messages_processed += 1
+        self.latencies_s.append(time.time() - send_time)
+        self.processing_times_s.append(processing_time_s)
+        if self.baseline_rss is None:
+            self.baseline_rss = current_rss_bytes()
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.start_time
+        throughput = self.messages_processed / elapsed if elapsed > 0 else 0.0
+        latency_ms = np.percentile(self.latencies_s, [50, 95, 99, 100]) * 1000 if self.latencies_s else np.zeros(4)
+        processing_ms = np.mean(self.processing_times_s) * 1000 if self.processing_times_s else 0.0
+        rss = current_rss_bytes()
+        growth = rss - self.baseline_rss if self.baseline_rss is not None else 0
+
+        return (f"[{elapsed / 3600:6.2f} h] processed {self.messages_processed}, dropped {self.dropped_messages} | "
+                f"throughput {throughput:.2f} msg/s, {throughput * self.message_bytes / 1e6:.1f} MB/s, {throughput * self.message_duration_s:.2f}x real time | "
+                f"latency p50 {latency_ms[0]:.1f} p95 {latency_ms[1]:.1f} p99 {latency_ms[2]:.1f} max {latency_ms[3]:.1f} ms | "
+                f"processing {processing_ms:.1f} ms/msg | RSS {rss / 1e6:.0f} MB ({growth / 1e6:+.0f} MB)")
+
+
+def build_processing_pipeline(sample_rate: float) -> Pipeline:
+    """Representative load on top of AcousticHandler: high-pass on every channel, then STFT and PSD"""
+    window_length_samples = int(DEFAULT_WINDOW_LENGTH_MS / 1000 * sample_rate)
+    stft = StftStage(sample_rate, window_length_samples, window_length_samples // 2)
+    return Pipeline([IirFilterStage(design_iir_highpass(HIGHPASS_CUTOFF_HZ, sample_rate)), stft, PsdStage(sample_rate, stft.windowing_coefficients, averages=4)])
+
+
+def run_soak_test(hours: float, rate_multiplier: float, report_interval_s: float, queue_size: int, cache_seconds: float,
+                  use_pipeline: bool, precomputed_messages: int):
+    config = LoadGeneratorConfig()
+    message_duration_s = config.samples_per_message / config.sample_rate
+    statistics = SoakStatistics(config.number_lines * config.total_sensors_per_line * config.samples_per_message * 4, message_duration_s)
+
+    acoustic_handler = AcousticHandler(config.sample_rate)
+    if use_pipeline:
+        acoustic_handler.processor.pipeline = build_processing_pipeline(config.sample_rate)
+
+    message_queue = multiprocessing.Queue(maxsize=queue_size)
+    stop_event = multiprocessing.Event()
+    generator_process = multiprocessing.Process(target=run_load_generator, args=(message_queue, stop_event, config, rate_multiplier, hours * 3600, precomputed_messages), daemon=True)
+    generator_process.start()
+
+    messages_since_clear = 0
+    next_report = time.perf_counter() + report_interval_s
+    try:
+        while True:
+            try:
+                item = message_queue.get(timeout=QUEUE_TIMEOUT_S)
+            except queue.Empty:
+                if not generator_process.is_alive():
+                    print("Load generator exited unexpectedly")
+                    break
+                continue
+            if item is None:
+                break
+
+            sequence_number, send_time, message = item
+            start = time.perf_counter()
+            acoustic_handler.retrieve_acoustic_data(message)
+            statistics.record(sequence_number, send_time, time.perf_counter() - start)
+
+            messages_since_clear += 1
+            if messages_since_clear * message_duration_s >= cache_seconds:
+                acoustic_handler.raw_data_handler.clear()
+                messages_since_clear = 0
+
+            if time.perf_counter() >= next_report:
+                print(statistics.report(), flush=True)
+                next_report += report_interval_s
+    except KeyboardInterrupt:
+        print("Interrupted")
+    finally:
+        stop_event.set()
+        generator_process.join(timeout=QUEUE_TIMEOUT_S)
+
+    print("\nFinal report:")
+    print(statistics.report())
+    if use_pipeline:
+        for timing in acoustic_handler.processor.pipeline.timings():
+            print(f"  {timing}")
+    return statistics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Soak test AcousticHandler with synthetic array data")
+    parser.add_argument("--hours", type=float, default=1.0, help="Test duration in hours")
+    parser.add_argument("--rate", type=float, default=1.0, help="Data rate as a multiple of the real array rate")
+    parser.add_argument("--report-interval", type=float, default=DEFAULT_REPORT_INTERVAL_S, help="Seconds between progress reports")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Messages buffered before the generator drops")
+    parser.add_argument("--cache-seconds", type=float, default=DEFAULT_CACHE_SECONDS, help="Seconds of raw data cached before clearing")
+    parser.add_argument("--no-pipeline", action="store_true", help="Only de-interleave and cache, skip filter/STFT/PSD processing")
+    parser.add_argument("--precomputed", type=int, default=0, help="Cycle through this many pregenerated messages instead of generating live")
+    args = parser.parse_args()
+
+    run_soak_test(args.hours, args.rate, args.report_interval, args.queue_size, args.cache_seconds, not args.no_pipeline, args.precomputed)
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import List, Tuple
 
 import pyqtgraph as pg
 import numpy as np
@@ -10,6 +10,12 @@ DEFAULT_Y_PADDING_RATIO = 0.4
 GRAPH_UPDATE_TIMEOUT = 0.05  # Seconds between graph updates when X-axis range is changed
 GRAPH_TIMER_UPDATE_TIMEOUT = int((GRAPH_UPDATE_TIMEOUT + 0.1) * 1000)  # Timer to render one last time after plot bounds change
 
+# Multi-channel dashboard defaults
+DASHBOARD_FRAME_INTERVAL_MS = 50  # Shared render budget, at most one repaint per frame interval for all channels
+DASHBOARD_POINT_BUDGET = 40000  # Total points drawn per frame, split between all channels
+DASHBOARD_HISTORY_SECONDS = 10.0  # Seconds of samples kept per channel
+DASHBOARD_CHANNEL_SPACING = 2.0  # Vertical offset between channel traces (raw data ranges from -1.0 to 1.0)
+
 class GeneralPlotWidget:
     """
     Generates a plot widget that has some logic to render only the data on screen for efficiency with large datasets.
@@ -108,6 +114,159 @@ class GeneralPlotWidget:
             self.plot_widget.setYRange(y_min - self.y_padding, y_max + self.y_padding)
 
 
+def min_max_decimate(data: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decimates the last axis of "data" to at most "max_points" by keeping the min and max of each bin, so peaks stay visible
+    Every leading axis (channel) is decimated in the same vectorized call
+    :return: (sample indices of the kept points, decimated data)
+    """
+    number_samples = data.shape[-1]
+    bin_size = -(-2 * number_samples // max(max_points, 2))
+    if bin_size <= 1:
+        return np.arange(number_samples), data
+
+    # Pad with the last sample so the data splits into whole bins
+    number_bins = -(-number_samples // bin_size)
+    padding = number_bins * bin_size - number_samples
+    if padding:
+        data = np.concatenate((data, np.repeat(data[..., -1:], padding, axis=-1)), axis=-1)
+    binned = data.reshape(data.shape[:-1] + (number_bins, bin_size))
+
+    decimated = np.empty(data.shape[:-1] + (number_bins, 2), dtype=data.dtype)
+    np.min(binned, axis=-1, out=decimated[..., 0])
+    np.max(binned, axis=-1, out=decimated[..., 1])
+
+    bin_starts = np.arange(number_bins) * bin_size
+    indices = np.stack((bin_starts, np.minimum(bin_starts + bin_size // 2, number_samples - 1)), axis=-1)
+    return indices.reshape(-1), decimated.reshape(data.shape[:-1] + (2 * number_bins,))
+
+
+class MultiChannelPlotWidget:
+    """
+    Dashboard that draws many channel traces, vertically offset, as a single curve in a single plot widget
+    New data only marks the plot dirty. One timer renders at most once per frame interval, decimating every channel in one
+    vectorized pass with a shared point budget, so showing many channels costs about the same as showing one
+    """
+    def __init__(self, x_axis_label: str, channel_labels: List[str], sample_rate: float, history_seconds: float = DASHBOARD_HISTORY_SECONDS,
+                 channel_spacing: float = DASHBOARD_CHANNEL_SPACING, point_budget: int = DASHBOARD_POINT_BUDGET, frame_interval_ms: int = DASHBOARD_FRAME_INTERVAL_MS):
+        self.channel_labels = channel_labels
+        self.number_channels = len(channel_labels)
+        self.sample_rate = sample_rate
+        self.history_samples = int(history_seconds * sample_rate)
+        self.channel_spacing = channel_spacing
+        self.point_budget = point_budget
+
+        # Linear buffer twice the history length. Writes append, and when full the newest history is shifted to the front
+        # so the valid data is always one contiguous slice
+        self.sample_buffer = np.zeros((self.number_channels, 2 * self.history_samples), dtype=np.float32)
+        self.buffer_start = 0
+        self.buffer_end = 0
+        self.total_samples_received = 0  # Used to compute the time of the first buffered sample
+
+        # Offset added to each channel so traces stack from top to bottom
+        self.channel_offsets = ((self.number_channels - 1 - np.arange(self.number_channels)) * self.channel_spacing).astype(np.float32)[:, np.newaxis]
+
+        self.follow_live = True
+        self.needs_render = False
+
+        self.widget_container, self.plot_widget = self.setup_widget_container(x_axis_label)
+
+        # Single curve for every channel, "connect" breaks the line between the end of one channel and the start of the next
+        self.curve = self.plot_widget.plot([], pen='b')
+
+        # One shared frame timer for all channels
+        self.render_timer = QTimer()
+        self.render_timer.setInterval(frame_interval_ms)
+        self.render_timer.timeout.connect(self.render_frame)
+        self.render_timer.start()
+
+    def setup_widget_container(self, x_axis_label: str):
+        container = QWidget()
+        vbox_layout = QVBoxLayout(container)
+
+        plot_widget = pg.PlotWidget()
+        plot_widget.getPlotItem().hideButtons()
+        plot_widget.setLabel('bottom', x_axis_label)
+        plot_widget.getPlotItem().disableAutoRange()
+        plot_widget.setYRange(-self.channel_spacing, self.number_channels * self.channel_spacing, padding=0)
+        plot_widget.getPlotItem().getAxis('left').setTicks([[(float(offset), label) for offset, label in zip(self.channel_offsets[:, 0], self.channel_labels)]])
+        plot_widget.getPlotItem().sigXRangeChanged.connect(self.mark_dirty)
+        plot_widget.getPlotItem().getViewBox().sigRangeChangedManually.connect(self.stop_following)
+        vbox_layout.addWidget(plot_widget)
+
+        follow_button = QPushButton("Follow live data")
+        follow_button.clicked.connect(self.start_following)
+        vbox_layout.addWidget(follow_button)
+
+        return container, plot_widget
+
+    def append_data(self, new_samples: np.ndarray):
+        """
+        Adds samples for every channel. Rendering happens on the next frame
+        :param new_samples: Samples in the shape (channels, samples), or any shape whose leading axes flatten to the channel count
+        """
+        new_samples = np.reshape(new_samples, (self.number_channels, -1))
+        number_new_samples = new_samples.shape[1]
+        self.total_samples_received += number_new_samples
+
+        if number_new_samples >= self.history_samples:
+            self.sample_buffer[:, :self.history_samples] = new_samples[:, -self.history_samples:]
+            self.buffer_start, self.buffer_end = 0, self.history_samples
+        else:
+            if self.buffer_end + number_new_samples > self.sample_buffer.shape[1]:
+                # Shift the newest history to the front of the buffer
+                keep = min(self.buffer_end - self.buffer_start, self.history_samples - number_new_samples)
+                self.sample_buffer[:, :keep] = self.sample_buffer[:, self.buffer_end - keep:self.buffer_end]
+                self.buffer_start, self.buffer_end = 0, keep
+            self.sample_buffer[:, self.buffer_end:self.buffer_end + number_new_samples] = new_samples
+            self.buffer_end += number_new_samples
+            self.buffer_start = max(self.buffer_start, self.buffer_end - self.history_samples)
+
+        self.needs_render = True
+
+    def mark_dirty(self):
+        self.needs_render = True
+
+    def stop_following(self):
+        self.follow_live = False
+
+    def start_following(self):
+        self.follow_live = True
+        self.needs_render = True
+
+    def render_frame(self):
+        if not self.needs_render or self.buffer_end == self.buffer_start:
+            return
+        self.needs_render = False
+
+        buffered_samples = self.buffer_end - self.buffer_start
+        first_sample_time = (self.total_samples_received - buffered_samples) / self.sample_rate
+        last_sample_time = self.total_samples_received / self.sample_rate
+
+        if self.follow_live:
+            # Block the range signal so following doesn't trigger an extra render
+            self.plot_widget.getPlotItem().blockSignals(True)
+            self.plot_widget.setXRange(first_sample_time, last_sample_time, padding=0)
+            self.plot_widget.getPlotItem().blockSignals(False)
+
+        # Only decimate the samples currently on screen
+        x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+        visible_start = int(np.clip(np.floor((x_min - first_sample_time) * self.sample_rate), 0, buffered_samples))
+        visible_stop = int(np.clip(np.ceil((x_max - first_sample_time) * self.sample_rate) + 1, visible_start, buffered_samples))
+        if visible_stop == visible_start:
+            self.curve.setData([], [])
+            return
+
+        visible = self.sample_buffer[:, self.buffer_start + visible_start:self.buffer_start + visible_stop]
+        indices, decimated = min_max_decimate(visible, self.point_budget // self.number_channels)
+
+        x_values = np.tile(first_sample_time + (visible_start + indices) / self.sample_rate, self.number_channels)
+        y_values = (decimated + self.channel_offsets).reshape(-1)
+        connect = np.ones(len(y_values), dtype=bool)
+        connect[len(indices) - 1::len(indices)] = False  # Break the line at the end of every channel
+        self.curve.setData(x_values, y_values, connect=connect)
+
+
 class FftPlotWidget(GeneralPlotWidget):
     def __init__(self):
         super().__init__()